@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark journal webhook: group commit vs fsync per request
+Mengukur latency ack (append sampai durable) dan throughput
+"""
+
+import sys
+import time
+import asyncio
+import tempfile
+import statistics
+
+from webhook_journal import WebhookJournal
+
+# Konfigurasi
+TOTAL_REQUESTS = 2000
+CONCURRENCY = 64
+
+
+async def run_benchmark(group_commit: bool, total: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal = WebhookJournal(f"{tmp_dir}/webhook.journal", group_commit=group_commit, compact_threshold=total * 4)
+        journal.open()
+
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def deliver(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                entry_id = await journal.append({"event": "push", "ref": "refs/heads/main", "after": f"{i:040x}"})
+                latencies.append(time.perf_counter() - started)
+                journal.mark_done(entry_id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(deliver(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+        await journal.close()
+
+        latencies.sort()
+        return {
+            "mode": "group commit" if group_commit else "fsync per request",
+            "throughput": total / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            "fsyncs": journal.stats["fsyncs"],
+        }
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else TOTAL_REQUESTS
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else CONCURRENCY
+
+    print(f"Requests: {total}, concurrency: {concurrency}")
+    print("=" * 72)
+    for group_commit in (False, True):
+        result = asyncio.run(run_benchmark(group_commit, total, concurrency))
+        print(
+            f"{result['mode']:<20} {result['throughput']:>9.0f} req/s   "
+            f"p50 {result['p50_ms']:>7.2f} ms   p99 {result['p99_ms']:>7.2f} ms   fsyncs {result['fsyncs']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark webhook server: cold-start dan requests per second per core
+Usage: python bench_server.py [workers] [durasi_detik]
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import importlib.util
+import subprocess
+
+# Konfigurasi
+PORT = 7099
+CONNECTIONS = 64
+PATH = "/status"
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webhook_server.py")
+
+
+def available_cores() -> int:
+    """Core yang boleh dipakai proses ini (affinity/cgroup), bukan total core mesin"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def wait_until_ready(port: int, timeout: float = 30.0):
+    """Tunggu sampai server menjawab /health"""
+    started = time.perf_counter()
+    request = b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+    while time.perf_counter() - started < timeout:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as sock:
+                sock.sendall(request)
+                if sock.recv(16).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError("Server tidak siap dalam batas waktu")
+
+
+async def load(port: int, duration: float, connections: int) -> int:
+    """Kirim request keep-alive sebanyak mungkin selama `duration` detik"""
+    request = f"GET {PATH} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+    deadline = time.perf_counter() + duration
+    done = 0
+
+    async def worker():
+        nonlocal done
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        while time.perf_counter() < deadline:
+            writer.write(request)
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in headers.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            done += 1
+        writer.close()
+
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    return done
+
+
+def run(workers: int, duration: float, loop: str, http: str, repo_path: str):
+    env = dict(os.environ, REPO_PATH=repo_path)
+    command = [sys.executable, SERVER_SCRIPT, "--port", str(PORT), "--workers", str(workers), "--loop", loop, "--http", http]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(PORT)
+        cold_start = time.perf_counter() - started
+        total = asyncio.run(load(PORT, duration, CONNECTIONS))
+    finally:
+        process.terminate()
+        process.wait()
+
+    # Worker lebih banyak dari core berbagi CPU, jadi dibagi core yang benar-benar dipakai
+    cores = min(workers, available_cores())
+    rps = total / duration
+    print(f"workers={workers:<3} loop={loop:<8} http={http:<10} cold-start {cold_start * 1000:>7.0f} ms   {rps:>8.0f} req/s   {rps / cores:>8.0f} req/s/core")
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else available_cores()
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    print(f"cores={available_cores()} (cpu_count={os.cpu_count()}), {CONNECTIONS} koneksi keep-alive, {duration:.0f} detik per run")
+
+    stacks = [("asyncio", "h11")]
+    if importlib.util.find_spec("uvloop") and importlib.util.find_spec("httptools"):
+        stacks.append(("uvloop", "httptools"))
+
+    with tempfile.TemporaryDirectory() as repo_path:
+        for loop, http in stacks:
+            for n in sorted({1, workers}):
+                run(n, duration, loop, http, repo_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 # Test Commands untuk Git Webhook Server
 # Ganti localhost:8000 dengan URL server Anda
 
+# Secret harus sama dengan server (dibuat otomatis di secrets/webhook_secret)
+SECRET=$(head -n 1 ./secrets/webhook_secret 2>/dev/null || echo "${webhook_secret:-your-secret-token-here}")
+
 # ====================================
 # 1. BASIC TESTS (tanpa signature)
 # ====================================
@@ -140,7 +143,7 @@ echo "7. Testing GitLab push..."
 curl -X POST http://localhost:8000/webhook \
   -H "Content-Type: application/json" \
   -H "X-Gitlab-Event: Push Hook" \
-  -H "X-Gitlab-Token: your-gitlab-token" \
+  -H "X-Gitlab-Token: $SECRET" \
   -d '{
     "object_kind": "push",
     "event_name": "push",
@@ -279,7 +282,6 @@ generate_github_signature() {
 
 # Test dengan signature yang benar (GitHub)
 echo "9. Testing GitHub webhook dengan signature..."
-SECRET="your-secret-token-here"
 PAYLOAD='{"ref":"refs/heads/main","commits":[{"id":"test123","message":"Test commit"}]}'
 SIGNATURE=$(generate_github_signature "$SECRET" "$PAYLOAD")
 
@@ -0,0 +1,70 @@
+#!/bin/bash
+# Test fan-out deploy dengan beberapa node agent lokal
+# Usage: ./test_fanout.sh [jumlah_node] [batch_size]
+
+NODES=${1:-3}
+BATCH_SIZE=${2:-2}
+BASE_PORT=7100
+WORKDIR=$(mktemp -d)
+SCRIPT_DIR=$(cd "$(dirname "$0")" && pwd)
+
+# Colors
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+BLUE='\033[0;34m'
+NC='\033[0m' # No Color
+
+export fanout_token="fanout-test-token"
+export GIT_AUTHOR_NAME=test GIT_AUTHOR_EMAIL=test@example.com GIT_COMMITTER_NAME=test GIT_COMMITTER_EMAIL=test@example.com
+
+cleanup() {
+    kill $AGENT_PIDS 2>/dev/null
+    wait $AGENT_PIDS 2>/dev/null
+    rm -rf "$WORKDIR"
+}
+trap cleanup EXIT
+
+echo -e "${BLUE}🚀 Fan-out test: $NODES node, batch size $BATCH_SIZE${NC}"
+echo "Workdir: $WORKDIR"
+echo "================================"
+
+# Remote + satu clone untuk push, dan satu checkout per node
+git init -q --bare -b main "$WORKDIR/remote.git"
+git clone -q "$WORKDIR/remote.git" "$WORKDIR/upstream" 2>/dev/null
+git -C "$WORKDIR/upstream" commit -q --allow-empty -m "initial"
+git -C "$WORKDIR/upstream" push -q origin HEAD:main
+
+NODE_LIST=""
+AGENT_PIDS=""
+for i in $(seq 1 "$NODES"); do
+    git clone -q -b main "$WORKDIR/remote.git" "$WORKDIR/node$i"
+    port=$((BASE_PORT + i))
+    # exec: PID yang dicatat adalah PID agent, bukan subshell, agar cleanup bisa menghentikannya
+    (cd "$WORKDIR" && exec python3 "$SCRIPT_DIR/webhook_fanout.py" agent --listen "127.0.0.1:$port" \
+        --repo-path "$WORKDIR/node$i" --branch main --lock-path "$WORKDIR/node$i.lock" >"$WORKDIR/agent$i.log" 2>&1) &
+    AGENT_PIDS="$AGENT_PIDS $!"
+    NODE_LIST="$NODE_LIST,127.0.0.1:$port"
+done
+NODE_LIST=${NODE_LIST#,}
+sleep 1
+
+# Commit baru di remote, lalu fan-out deploy ke semua node
+git -C "$WORKDIR/upstream" commit -q --allow-empty -m "deploy me"
+git -C "$WORKDIR/upstream" push -q origin HEAD:main
+EXPECTED=$(git -C "$WORKDIR/upstream" rev-parse HEAD)
+
+echo "Testing fan-out deploy..."
+(cd "$WORKDIR" && python3 "$SCRIPT_DIR/webhook_fanout.py" deploy --nodes "$NODE_LIST" --batch-size "$BATCH_SIZE" 2>/dev/null) | jq -c '{status, succeeded, total}'
+
+FAILED=0
+for i in $(seq 1 "$NODES"); do
+    actual=$(git -C "$WORKDIR/node$i" rev-parse HEAD)
+    if [ "$actual" = "$EXPECTED" ]; then
+        echo -e "  node$i ${GREEN}✓ ${actual:0:8}${NC}"
+    else
+        echo -e "  node$i ${RED}✗ ${actual:0:8} (expected ${EXPECTED:0:8})${NC}"
+        FAILED=1
+    fi
+done
+
+exit $FAILED
@@ -7,13 +7,25 @@ Mendukung GitHub, GitLab, dan Gitea
 import hmac
 import hashlib
 import json
+import os
 import requests
 import sys
 from datetime import datetime
 
 # Konfigurasi
 WEBHOOK_URL = "http://localhost:8000/webhook"
-SECRET_TOKEN = "your-secret-token-here"  # Harus sama dengan config server
+SECRET_FILE = "./secrets/webhook_secret"  # Dibuat otomatis oleh server saat startup
+
+
+def read_secret():
+    """Secret yang sama dengan server (secrets/webhook_secret), fallback ke env webhook_secret"""
+    if os.path.exists(SECRET_FILE):
+        with open(SECRET_FILE, "r") as f:
+            return f.readline().strip()
+    return os.environ.get("webhook_secret", "your-secret-token-here")
+
+
+SECRET_TOKEN = read_secret()  # Harus sama dengan config server
 
 def generate_github_signature(secret, payload):
     """Generate signature untuk GitHub webhook"""
@@ -222,7 +234,9 @@ def test_gitea_webhook():
     headers = {
         "Content-Type": "application/json",
         "X-Gitea-Event": "push",
+        "X-GitHub-Event": "push",  # Gitea asli juga mengirim header GitHub
         "X-Gitea-Delivery": f"gitea-{datetime.now().timestamp()}",
+        "X-Gitea-Signature": generate_gitea_signature(SECRET_TOKEN, payload_str),
         "User-Agent": "Gitea/test"
     }
     
@@ -263,14 +277,16 @@ def test_ping_events():
         }
     }
     
+    payload_str = json.dumps(github_ping)
     headers = {
         "Content-Type": "application/json",
         "X-GitHub-Event": "ping",
-        "X-GitHub-Delivery": f"ping-{datetime.now().timestamp()}"
+        "X-GitHub-Delivery": f"ping-{datetime.now().timestamp()}",
+        "X-Hub-Signature-256": generate_github_signature(SECRET_TOKEN, payload_str)
     }
     
     try:
-        response = requests.post(WEBHOOK_URL, headers=headers, json=github_ping)
+        response = requests.post(WEBHOOK_URL, headers=headers, data=payload_str)
         print(f"     Status: {response.status_code}")
     except Exception as e:
         print(f"     Error: {e}")
@@ -4,7 +4,7 @@
 
 # Default values
 WEBHOOK_URL=${1:-"http://localhost:8000"}
-SECRET_TOKEN=${2:-"your-secret-token-here"}
+SECRET_TOKEN=${2:-$(head -n 1 ./secrets/webhook_secret 2>/dev/null || echo "your-secret-token-here")}
 
 # Colors
 RED='\033[0;31m'
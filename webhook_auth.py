@@ -0,0 +1,158 @@
+import os
+import hmac
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Header signature per provider, urut prioritas (Gitea juga mengirim X-Hub-Signature-256)
+SIGNATURE_HEADERS = (
+    ("gitea", "X-Gitea-Signature"),
+    ("gogs", "X-Gogs-Signature"),
+    ("github", "X-Hub-Signature-256"),
+    ("gitlab", "X-Gitlab-Token"),
+)
+
+
+class SecretKey:
+    """Satu secret aktif, state HMAC dibangun sekali dan di-copy per request"""
+
+    __slots__ = ("token", "_hmac")
+
+    def __init__(self, secret: str):
+        self.token = secret.encode("utf-8")
+        self._hmac = hmac.new(self.token, digestmod=hashlib.sha256)
+
+    def hexdigest(self, body: bytes) -> str:
+        mac = self._hmac.copy()
+        mac.update(body)
+        return mac.hexdigest()
+
+
+class SecretStore:
+    """Cache secret webhook dengan reload otomatis saat file berubah.
+
+    `<name>` berisi secret default, `<name>.<repo>` secret khusus repository
+    (`/` pada nama repository diganti `__`). Satu file boleh berisi beberapa
+    secret (satu per baris) yang semuanya aktif, untuk rotasi tanpa downtime:
+    tambah secret baru, ganti di provider, lalu hapus secret lama.
+    """
+
+    def __init__(self, secrets_dir: str, name: str = "webhook_secret", reload_interval: float = 1.0):
+        self.secrets_dir = secrets_dir
+        self.name = name
+        self.reload_interval = reload_interval
+        self._keys: Dict[Optional[str], List[SecretKey]] = {}
+        self._fingerprint: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def keys_for(self, repository: Optional[str] = None) -> List[SecretKey]:
+        """Secret aktif untuk repository, fallback ke secret default"""
+        self._maybe_reload()
+        if repository:
+            keys = self._keys.get(repository.replace("/", "__"))
+            if keys:
+                return keys
+        return self._keys.get(None, [])
+
+    def has_secrets(self) -> bool:
+        self._maybe_reload()
+        return any(self._keys.values())
+
+    def reload(self):
+        with self._lock:
+            fingerprint, files = self._scan()
+            keys: Dict[Optional[str], List[SecretKey]] = {}
+            for repository, path in files.items():
+                try:
+                    with open(path, "r") as f:
+                        secrets = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+                except IOError as e:
+                    logger.warning(f"Gagal membaca secret {path}: {str(e)}")
+                    continue
+                keys[repository] = [SecretKey(secret) for secret in secrets]
+
+            # Fallback yang sama dengan get_secret: environment variable
+            if not keys.get(None) and os.environ.get(self.name):
+                keys[None] = [SecretKey(os.environ[self.name])]
+
+            if self._fingerprint is not None:
+                logger.info(f"Secret webhook di-reload ({sum(len(k) for k in keys.values())} secret aktif)")
+            self._keys = keys
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        if self._scan()[0] != self._fingerprint:
+            self.reload()
+
+    def _scan(self) -> Tuple[Tuple, Dict[Optional[str], str]]:
+        files: Dict[Optional[str], str] = {}
+        stats = []
+        try:
+            names = sorted(os.listdir(self.secrets_dir))
+        except OSError:
+            names = []
+
+        for name in names:
+            if name == self.name:
+                repository = None
+            elif name.startswith(f"{self.name}."):
+                repository = name[len(self.name) + 1 :]
+            else:
+                continue
+
+            path = os.path.join(self.secrets_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files[repository] = path
+            stats.append((name, st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(stats), files
+
+
+def repository_name(payload: Dict[str, Any]) -> Optional[str]:
+    """Nama lengkap repository dari payload GitHub/Gitea (repository) atau GitLab (project)"""
+    # Dipanggil sebelum signature diverifikasi, jadi isi payload belum bisa dipercaya
+    if not isinstance(payload, dict):
+        return None
+    for key, field in (("repository", "full_name"), ("project", "path_with_namespace")):
+        value = payload.get(key)
+        if isinstance(value, dict) and isinstance(value.get(field), str) and value[field]:
+            return value[field]
+    return None
+
+
+def verify_request(store: SecretStore, headers, body: bytes, repository: Optional[str] = None) -> Tuple[bool, str]:
+    """Verifikasi webhook sesuai skema provider, return (valid, provider)
+
+    Semua secret aktif selalu dibandingkan (tanpa early exit) dengan
+    hmac.compare_digest, agar waktu verifikasi tidak bergantung pada secret
+    mana yang cocok.
+    """
+    for provider, header in SIGNATURE_HEADERS:
+        received = headers.get(header)
+        if received:
+            break
+    else:
+        return False, "unsigned"
+
+    received = received.strip().encode("utf-8")
+    if provider == "github":
+        received = received[len(b"sha256=") :] if received.startswith(b"sha256=") else b""
+
+    valid = False
+    for key in store.keys_for(repository):
+        expected = key.token if provider == "gitlab" else key.hexdigest(body).encode("ascii")
+        valid |= hmac.compare_digest(expected, received)
+    return valid, provider
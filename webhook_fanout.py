@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Fan-out deploy ke beberapa node.
+
+Receiver memverifikasi webhook sekali lalu meneruskan command deploy ringkas ke
+node agent lewat koneksi persistent (TCP atau Unix socket, JSON per baris).
+Node agent menjalankan deploy lewat run_deploy_action yang sama dengan /webhook.
+
+    python webhook_fanout.py agent --listen 0.0.0.0:7100 --repo-path /app/repository
+    python webhook_fanout.py deploy --nodes host1:7100,host2:7100 --batch-size 1
+"""
+
+import os
+import sys
+import json
+import hmac
+import time
+import hashlib
+import secrets
+import uuid
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from webhook_func import logger, setup_logging, get_secret, run_deploy_action
+from webhook_tracing import span
+
+DEFAULT_PORT = 7100
+# Batas satu baris JSON (output git/post-deploy bisa panjang)
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+def challenge_response(token: str, challenge: str) -> str:
+    """Bukti token untuk challenge dari agent (token sendiri tidak pernah dikirim)"""
+    return hmac.new(token.encode("utf-8"), challenge.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def parse_nodes(value: Optional[str]) -> List[str]:
+    return [node.strip() for node in (value or "").split(",") if node.strip()]
+
+
+async def open_connection(address: str):
+    """Buka koneksi ke `host:port` atau `unix:/path/socket`"""
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[len("unix:"):], limit=STREAM_LIMIT)
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host or "127.0.0.1", int(port or DEFAULT_PORT), limit=STREAM_LIMIT)
+
+
+async def send_message(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+    writer.write((json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8"))
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class NodeConnection:
+    """Koneksi persistent ke satu node agent, reconnect otomatis jika putus"""
+
+    def __init__(self, address: str, token: str, timeout: float):
+        self.address = address
+        self.token = token
+        self.timeout = timeout
+        self.connected = False
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(open_connection(self.address), timeout=10)
+        challenge = await asyncio.wait_for(read_message(self._reader), timeout=10)
+        if not challenge or not challenge.get("challenge"):
+            await self.close()
+            raise ConnectionError(f"Node {self.address} tidak mengirim challenge")
+        await send_message(self._writer, {"op": "hello", "mac": challenge_response(self.token, str(challenge["challenge"]))})
+        reply = await asyncio.wait_for(read_message(self._reader), timeout=10)
+        if not reply or not reply.get("ok"):
+            await self.close()
+            raise ConnectionError(f"Node {self.address} menolak koneksi: {(reply or {}).get('error', 'tidak ada balasan')}")
+        self.connected = True
+        logger.info(f"Fan-out: terhubung ke node {self.address}")
+
+    async def request(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        """Kirim command dan tunggu balasan.
+
+        Retry satu kali hanya jika command belum terkirim (koneksi lama sudah
+        putus). Setelah terkirim, command tidak dikirim ulang: node mungkin
+        sedang atau sudah menjalankannya.
+        """
+        async with self._lock:
+            for attempt in range(2):
+                sent = False
+                try:
+                    # Koneksi yang sudah ditutup node terlihat sebagai EOF di reader
+                    if self.connected and self._reader.at_eof():
+                        await self.close()
+                    if not self.connected:
+                        await self._connect()
+                    await send_message(self._writer, command)
+                    sent = True
+                    reply = await asyncio.wait_for(read_message(self._reader), timeout=self.timeout)
+                    if reply is None:
+                        raise ConnectionError("Koneksi ditutup oleh node")
+                    return reply
+                except asyncio.TimeoutError:
+                    # Dicek sebelum OSError: di Python 3.11 TimeoutError adalah subclass OSError.
+                    # Balasan yang terlambat tidak boleh terbaca sebagai balasan command berikutnya
+                    await self.close()
+                    raise
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                    await self.close()
+                    if sent or attempt == 1:
+                        raise ConnectionError(f"{type(e).__name__}: {e}") from e
+
+    async def close(self):
+        self.connected = False
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+
+class FanoutCoordinator:
+    """Kirim command deploy ke semua node secara rolling (per batch, paralel di dalam batch)"""
+
+    def __init__(self, nodes: List[str], token: str, batch_size: int = 0, timeout: float = 600, halt_on_failure: bool = True):
+        self.nodes = [NodeConnection(address, token, timeout) for address in nodes]
+        self.batch_size = batch_size if batch_size > 0 else len(self.nodes)
+        self.halt_on_failure = halt_on_failure
+        self.last_deploy: Optional[Dict[str, Any]] = None
+
+    async def connect(self):
+        """Buka koneksi ke semua node lebih awal (best effort, node yang gagal dicoba lagi saat deploy)"""
+        for node, result in zip(self.nodes, await asyncio.gather(*(node.request({"op": "ping"}) for node in self.nodes), return_exceptions=True)):
+            if isinstance(result, Exception):
+                logger.warning(f"Fan-out: node {node.address} belum bisa dihubungi: {type(result).__name__}: {result}")
+
+    async def deploy(self, action: str, ref: str) -> tuple[bool, Dict[str, Any]]:
+        command = {"id": uuid.uuid4().hex, "op": "deploy", "action": action, "ref": ref}
+        results: List[Dict[str, Any]] = []
+        halted = False
+
+        with span("fanout", nodes=len(self.nodes), batch_size=self.batch_size):
+            for start in range(0, len(self.nodes), self.batch_size):
+                batch = self.nodes[start : start + self.batch_size]
+                if halted:
+                    results += [{"node": node.address, "status": "skipped"} for node in batch]
+                    continue
+
+                batch_results = await asyncio.gather(*(self._deploy_node(node, command) for node in batch))
+                results += batch_results
+                if self.halt_on_failure and any(result["status"] != "success" for result in batch_results):
+                    logger.error("Fan-out: batch gagal, rolling deploy dihentikan")
+                    halted = True
+
+        succeeded = sum(1 for result in results if result["status"] == "success")
+        summary = {
+            "id": command["id"],
+            "action": action,
+            "ref": ref,
+            "status": "success" if succeeded == len(results) else ("partial" if succeeded else "error"),
+            "succeeded": succeeded,
+            "total": len(results),
+            "nodes": results,
+            "timestamp": datetime.now().isoformat(),
+        }
+        self.last_deploy = summary
+        return succeeded == len(results), summary
+
+    async def _deploy_node(self, node: NodeConnection, command: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with span("node", node=node.address) as node_span:
+            try:
+                reply = await node.request(command)
+                result = {"node": node.address, "status": "success" if reply.get("ok") else "error", "output": reply.get("output")}
+            except Exception as e:
+                logger.error(f"Fan-out: deploy ke {node.address} gagal: {type(e).__name__}: {e}")
+                result = {"node": node.address, "status": "error", "output": f"{type(e).__name__}: {e}"}
+            node_span.set_tag("status", result["status"])
+
+        result["duration"] = round(time.perf_counter() - started, 3)
+        node.last_result = result
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "nodes": [{"node": node.address, "connected": node.connected, "last_result": node.last_result} for node in self.nodes],
+            "last_deploy": self.last_deploy,
+        }
+
+    async def close(self):
+        for node in self.nodes:
+            await node.close()
+
+
+class NodeAgent:
+    """Terima command deploy dari receiver dan jalankan pada checkout lokal"""
+
+    def __init__(self, CONFIG, token: str):
+        self.CONFIG = CONFIG
+        self.token = token
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername") or "unix"
+        try:
+            # Challenge baru per koneksi, receiver membalas HMAC(token, challenge)
+            challenge = secrets.token_hex(32)
+            await send_message(writer, {"challenge": challenge})
+            hello = await asyncio.wait_for(read_message(reader), timeout=10)
+            expected = challenge_response(self.token, challenge)
+            if not hello or hello.get("op") != "hello" or not hmac.compare_digest(str(hello.get("mac", "")), expected):
+                logger.warning(f"Agent: koneksi dari {peer} ditolak (token salah)")
+                await send_message(writer, {"ok": False, "error": "Unauthorized"})
+                return
+            await send_message(writer, {"ok": True, "node": os.uname().nodename})
+            logger.info(f"Agent: receiver {peer} terhubung")
+
+            # Command diproses berurutan per koneksi
+            while True:
+                command = await read_message(reader)
+                if command is None:
+                    break
+                await send_message(writer, await self.execute(command))
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Agent: koneksi {peer} error: {type(e).__name__}: {e}")
+        finally:
+            writer.close()
+
+    async def execute(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        if command.get("op") == "ping":
+            return {"id": command.get("id"), "ok": True}
+        if command.get("op") != "deploy":
+            return {"id": command.get("id"), "ok": False, "output": f"Command tidak dikenal: {command.get('op')}"}
+
+        logger.info(f"Agent: deploy {command.get('action')} {command.get('ref') or self.CONFIG['BRANCH']} ({command.get('id')})")
+        started = time.perf_counter()
+        with span("agent_deploy", command_id=command.get("id")):
+            success, output = await run_deploy_action(self.CONFIG, command.get("action", "deploy"), command.get("ref", ""))
+        return {"id": command.get("id"), "ok": success, "output": output, "duration": round(time.perf_counter() - started, 3)}
+
+    async def serve(self, listen: str):
+        if listen.startswith("unix:"):
+            server = await asyncio.start_unix_server(self.handle, listen[len("unix:"):], limit=STREAM_LIMIT)
+        else:
+            host, _, port = listen.rpartition(":")
+            server = await asyncio.start_server(self.handle, host or "0.0.0.0", int(port or DEFAULT_PORT), limit=STREAM_LIMIT)
+
+        logger.info(f"=== Fan-out agent listening di {listen} (repo: {self.CONFIG['REPO_PATH']}, branch: {self.CONFIG['BRANCH']}) ===")
+        async with server:
+            await server.serve_forever()
+
+
+def fanout_token() -> str:
+    """Token shared receiver <-> agent (secret fanout_token, terpisah dari secret webhook)"""
+    return get_secret("fanout_token") or ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan-out deploy ke beberapa node")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    agent_parser = subparsers.add_parser("agent", help="Jalankan node agent")
+    agent_parser.add_argument("--listen", default=f"0.0.0.0:{DEFAULT_PORT}", help="host:port atau unix:/path/socket")
+    agent_parser.add_argument("--repo-path", default=os.environ.get("REPO_PATH", "./repository"))
+    agent_parser.add_argument("--branch", default=os.environ.get("BRANCH", "main"))
+    agent_parser.add_argument("--lock-path", default=os.environ.get("DEPLOY_LOCK_PATH", "./logs/deploy.lock"))
+
+    deploy_parser = subparsers.add_parser("deploy", help="Kirim satu deploy ke node (tanpa receiver)")
+    deploy_parser.add_argument("--nodes", default=os.environ.get("FANOUT_NODES"), help="Daftar node dipisah koma")
+    deploy_parser.add_argument("--batch-size", type=int, default=int(os.environ.get("FANOUT_BATCH_SIZE", 0)))
+    deploy_parser.add_argument("--action", default="deploy", choices=["deploy", "checkout"])
+    deploy_parser.add_argument("--ref", default="")
+    args = parser.parse_args()
+
+    setup_logging()
+    token = fanout_token()
+    if not token:
+        logger.error("Token fan-out tidak ditemukan (secret fanout_token)")
+        sys.exit(1)
+
+    if args.command == "agent":
+        CONFIG = {
+            "REPO_PATH": args.repo_path,
+            "BRANCH": args.branch,
+            "POST_DEPLOY_SCRIPT": None,
+            "LOCK_PATH": args.lock_path,
+        }
+        asyncio.run(NodeAgent(CONFIG, token).serve(args.listen))
+    else:
+        nodes = parse_nodes(args.nodes)
+        if not nodes:
+            logger.error("Tidak ada node (gunakan --nodes atau FANOUT_NODES)")
+            sys.exit(1)
+
+        async def run():
+            coordinator = FanoutCoordinator(nodes, token, batch_size=args.batch_size)
+            try:
+                return await coordinator.deploy(args.action, args.ref)
+            finally:
+                await coordinator.close()
+
+        success, summary = asyncio.run(run())
+        print(json.dumps(summary, indent=2))
+        sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
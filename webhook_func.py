@@ -1,24 +1,77 @@
 import os
+import fcntl
 import secrets
 import string
+import asyncio
 import logging
-import hmac
-import hashlib
-import subprocess
+import shlex
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(f"./logs/{datetime.now().strftime('%Y-%m')}_webhook.log"),
-        logging.StreamHandler(),
-    ],
-)
+from webhook_tracing import span
+
 logger = logging.getLogger(__name__)
 
+# Serialisasi deploy di dalam satu proses; antar worker pakai flock
+_deploy_lock = asyncio.Lock()
+
+
+def setup_logging():
+    """Setup logging ke file dan console (dipanggil sekali per proses)"""
+    if logging.getLogger().handlers:
+        return
+
+    os.makedirs("./logs", exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - [{os.getpid()}] %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler(f"./logs/{datetime.now().strftime('%Y-%m')}_webhook.log"),
+            logging.StreamHandler(),
+        ],
+    )
+
+
+def acquire_file_lock(path: str, blocking: bool = True) -> Optional[int]:
+    """Ambil flock exclusive pada file, return fd (None jika non-blocking dan lock dipegang proses lain)"""
+    lock_dir = os.path.dirname(path)
+    if lock_dir:
+        os.makedirs(lock_dir, exist_ok=True)
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def release_file_lock(fd: Optional[int]):
+    if fd is None:
+        return
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+@asynccontextmanager
+async def deploy_lock(CONFIG):
+    """Pastikan hanya satu git operation berjalan pada repository, lintas worker"""
+    with span("lock"):
+        await _deploy_lock.acquire()
+        try:
+            fd = await asyncio.to_thread(acquire_file_lock, CONFIG["LOCK_PATH"])
+        except BaseException:
+            _deploy_lock.release()
+            raise
+
+    try:
+        yield
+    finally:
+        release_file_lock(fd)
+        _deploy_lock.release()
+
 
 def get_secret(secret_name):
     try:
@@ -64,34 +117,28 @@ def ensure_webhook_secret():
         logger.info(f"File webhook secret sudah ada: {secret_file}")
 
 
-def verify_signature(payload_body: bytes, signature_header: str, secret: str) -> bool:
-    """Verifikasi signature dari GitHub webhook"""
-    if not signature_header:
-        return False
-
-    hash_object = hmac.new(secret.encode("utf-8"), msg=payload_body, digestmod=hashlib.sha256)
-    expected_signature = "sha256=" + hash_object.hexdigest()
-
-    return hmac.compare_digest(expected_signature, signature_header)
-
-
 async def execute_command(command: str, cwd: Optional[str] = None) -> tuple[bool, str]:
-    """Eksekusi command dengan error handling"""
+    """Eksekusi command dengan error handling (tanpa memblokir event loop)"""
     try:
-        result = subprocess.run(command, shell=True, cwd=cwd, capture_output=True, text=True, timeout=300)  # 5 menit timeout
-
-        if result.returncode == 0:
+        process = await asyncio.create_subprocess_shell(command, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=300)  # 5 menit timeout
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            logger.error(f"Command timeout: {command}")
+            return False, "Command timeout"
+
+        stdout, stderr = stdout.decode(errors="replace"), stderr.decode(errors="replace")
+        if process.returncode == 0:
             logger.info(f"Command berhasil: {command}")
-            logger.info(f"Output: {result.stdout}")
-            return True, result.stdout
+            logger.info(f"Output: {stdout}")
+            return True, stdout
         else:
             logger.error(f"Command gagal: {command}")
-            logger.error(f"Error: {result.stderr}")
-            return False, result.stderr
+            logger.error(f"Error: {stderr}")
+            return False, stderr
 
-    except subprocess.TimeoutExpired:
-        logger.error(f"Command timeout: {command}")
-        return False, "Command timeout"
     except Exception as e:
         logger.error(f"Exception saat eksekusi command: {str(e)}")
         return False, str(e)
@@ -106,24 +153,97 @@ async def pull_repository(CONFIG) -> tuple[bool, str]:
         logger.error(f"Repository path tidak ditemukan: {CONFIG['REPO_PATH']}")
         return False, "Repository path tidak ditemukan"
 
-    # Git pull
-    pull_command = f"git pull origin {CONFIG['BRANCH']}"
-    success, output = await execute_command(pull_command, cwd=CONFIG["REPO_PATH"])
+    async with deploy_lock(CONFIG):
+        # Fetch, checkout dan merge dipisah agar durasi tiap stage terlihat di trace.
+        # Action checkout bisa meninggalkan HEAD di branch lain atau tag, jadi HEAD
+        # dikembalikan ke BRANCH dulu. Tanpa --force dan hanya fast-forward: perubahan
+        # lokal atau commit lokal membuat deploy gagal, bukan hilang diam-diam.
+        branch = CONFIG["BRANCH"]
+        remote_ref = f"refs/remotes/origin/{branch}"
+        with span("fetch", branch=branch):
+            success, output = await execute_command(f"git fetch origin {shlex.quote(f'+refs/heads/{branch}:{remote_ref}')}", cwd=CONFIG["REPO_PATH"])
+        if not success:
+            return False, f"Git pull gagal: {output}"
+
+        with span("checkout", ref=f"refs/heads/{branch}"):
+            success, output = await execute_command(f"git checkout {shlex.quote(branch)} --", cwd=CONFIG["REPO_PATH"])
+        if not success:
+            return False, f"Git checkout {branch} gagal: {output}"
+
+        with span("merge"):
+            success, output = await execute_command(f"git merge --ff-only {shlex.quote(remote_ref)}", cwd=CONFIG["REPO_PATH"])
+        if not success:
+            return False, f"Git pull gagal: {output}"
+
+        await run_post_deploy(CONFIG)
 
-    if not success:
-        return False, f"Git pull gagal: {output}"
+    return True, output
 
-    # Jalankan post-deploy script jika ada
-    if CONFIG["POST_DEPLOY_SCRIPT"]:
-        logger.info("Menjalankan post-deploy script...")
-        script_success, script_output = await execute_command(CONFIG["POST_DEPLOY_SCRIPT"], cwd=CONFIG["REPO_PATH"])
 
-        if not script_success:
-            logger.warning(f"Post-deploy script gagal: {script_output}")
+async def checkout_ref(CONFIG, ref: str) -> tuple[bool, str]:
+    """Fetch dan checkout ref tertentu (branch atau tag) dari remote"""
+    logger.info(f"Memulai checkout {ref}...")
+
+    if not os.path.exists(CONFIG["REPO_PATH"]):
+        logger.error(f"Repository path tidak ditemukan: {CONFIG['REPO_PATH']}")
+        return False, "Repository path tidak ditemukan"
+
+    if ref.startswith("refs/tags/"):
+        local_ref = ref
+        checkout_command = f"git checkout --detach {shlex.quote(ref)}"
+    elif ref.startswith("refs/heads/"):
+        branch = ref[len("refs/heads/"):]
+        local_ref = f"refs/remotes/origin/{branch}"
+        checkout_command = f"git checkout -B {shlex.quote(branch)} {shlex.quote(local_ref)}"
+    else:
+        return False, f"Ref tidak didukung: {ref}"
+
+    async with deploy_lock(CONFIG):
+        fetch_command = f"git fetch origin {shlex.quote(f'+{ref}:{local_ref}')}"
+        with span("fetch", ref=ref):
+            success, output = await execute_command(fetch_command, cwd=CONFIG["REPO_PATH"])
+        if not success:
+            return False, f"Git fetch gagal: {output}"
+
+        with span("checkout", ref=ref):
+            success, output = await execute_command(checkout_command, cwd=CONFIG["REPO_PATH"])
+        if not success:
+            return False, f"Git checkout gagal: {output}"
+
+        await run_post_deploy(CONFIG)
 
     return True, output
 
 
+async def run_deploy_action(CONFIG, action: str, ref: str) -> tuple[bool, str]:
+    """Jalankan action hasil routing: deploy (pull BRANCH) atau checkout (ref dari event)"""
+    with span("deploy", action=action, ref=ref) as deploy_span:
+        if action == "checkout":
+            success, output = await checkout_ref(CONFIG, ref)
+        else:
+            success, output = await pull_repository(CONFIG)
+        deploy_span.set_tag("success", success)
+    return success, output
+
+
+async def run_post_deploy(CONFIG):
+    """Jalankan post-deploy script jika ada (string, atau list berisi beberapa step)"""
+    steps = CONFIG["POST_DEPLOY_SCRIPT"]
+    if not steps:
+        return
+    if isinstance(steps, str):
+        steps = [steps]
+
+    logger.info("Menjalankan post-deploy script...")
+    for index, step in enumerate(steps):
+        with span("post_deploy", step=index, command=step) as step_span:
+            script_success, script_output = await execute_command(step, cwd=CONFIG["REPO_PATH"])
+            step_span.set_tag("success", script_success)
+
+        if not script_success:
+            logger.warning(f"Post-deploy script gagal: {script_output}")
+
+
 async def process_webhook_background(CONFIG, payload: dict, event_type: str):
     """Background task untuk memproses webhook"""
     logger.info(f"Background processing webhook: {event_type}")
@@ -134,7 +254,8 @@ async def process_webhook_background(CONFIG, payload: dict, event_type: str):
 
         if ref == target_ref:
             logger.info(f"Push ke branch {CONFIG['BRANCH']} terdeteksi")
-            success, message = await pull_repository(CONFIG)
+            with span("background", event=event_type):
+                success, message = await pull_repository(CONFIG)
 
             if success:
                 logger.info("Background webhook berhasil diproses")
@@ -0,0 +1,225 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from webhook_func import acquire_file_lock, release_file_lock
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookJournal:
+    """Write-ahead journal untuk webhook yang sudah diterima.
+
+    Setiap webhook dicatat (append + fsync) sebelum di-acknowledge. Append yang
+    datang bersamaan digabung ke satu write + satu fsync (group commit).
+    Entry yang belum selesai di-replay saat startup, entry yang sudah selesai
+    dibuang saat compaction.
+
+    Setiap worker menulis ke segment miliknya sendiri dan memegang flock pada
+    `<segment>.lock` selama hidup. Segment yang lock-nya bisa diambil berarti
+    pemiliknya sudah mati, dan diambil alih lewat adopt_orphans().
+    """
+
+    def __init__(self, path: str, group_commit: bool = True, compact_threshold: int = 1000):
+        self.path = path
+        self.group_commit = group_commit
+        self.compact_threshold = compact_threshold
+        self.stats = {"appends": 0, "fsyncs": 0, "compactions": 0}
+
+        self._fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._buffer: List[tuple[bytes, Optional[asyncio.Future]]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._records_since_compact = 0
+
+    def open(self) -> List[Dict[str, Any]]:
+        """Buka journal dan kembalikan entry yang belum selesai (untuk di-replay)"""
+        journal_dir = os.path.dirname(self.path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+
+        self._lock_fd = acquire_file_lock(f"{self.path}.lock", blocking=False)
+        if self._lock_fd is None:
+            raise RuntimeError(f"Journal {self.path} sedang dipakai proses lain")
+
+        self._pending = _load_segment(self.path)
+        self._compact_sync(dict(self._pending))
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+        if self._pending:
+            logger.info(f"Journal: {len(self._pending)} webhook belum selesai ditemukan di {self.path}")
+        return list(self._pending.values())
+
+    async def close(self):
+        """Tunggu semua append selesai lalu tutup file journal"""
+        if self._flusher is not None:
+            await self._flusher
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+        # Segment kosong dihapus agar tidak menumpuk (pid worker berganti tiap restart)
+        if self._lock_fd is not None:
+            if not self._pending:
+                os.unlink(self.path)
+                os.unlink(f"{self.path}.lock")
+            release_file_lock(self._lock_fd)
+            self._lock_fd = None
+
+    async def adopt_orphans(self) -> List[Dict[str, Any]]:
+        """Ambil alih entry yang belum selesai dari segment milik worker yang sudah mati"""
+        journal_dir = os.path.dirname(self.path) or "."
+        adopted: List[Dict[str, Any]] = []
+
+        for name in sorted(os.listdir(journal_dir)):
+            segment = os.path.join(journal_dir, name)
+            if not name.endswith(".journal") or segment == self.path:
+                continue
+
+            lock_path = f"{segment}.lock"
+            fd = acquire_file_lock(lock_path, blocking=False)
+            if fd is None:
+                continue
+
+            try:
+                # Lock file sudah di-unlink oleh worker lain yang lebih dulu mengambil alih
+                if not os.path.exists(lock_path) or os.stat(lock_path).st_ino != os.fstat(fd).st_ino:
+                    continue
+
+                entries = list(_load_segment(segment).values())
+                for entry in entries:
+                    await self.append(entry)
+
+                # Entry sudah durable di segment sendiri, segment lama aman dihapus
+                if os.path.exists(segment):
+                    os.unlink(segment)
+                os.unlink(lock_path)
+                adopted.extend(entries)
+            finally:
+                release_file_lock(fd)
+
+        if adopted:
+            logger.info(f"Journal: {len(adopted)} webhook diambil alih dari worker yang sudah berhenti")
+        return adopted
+
+    async def append(self, entry: Dict[str, Any]) -> str:
+        """Catat webhook yang diterima, return setelah entry durable di disk"""
+        entry_id = entry.get("id") or uuid.uuid4().hex
+        record = {"op": "accept", "id": entry_id, "ts": datetime.now().isoformat(), **entry}
+        self._pending[entry_id] = record
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(record, future)
+        await future
+
+        self.stats["appends"] += 1
+        return entry_id
+
+    def mark_done(self, entry_id: str, success: bool = True):
+        """Tandai entry selesai.
+
+        Tidak menunggu fsync: record "done" ikut fsync berikutnya. Jika hilang
+        karena crash, akibatnya hanya satu pull ulang saat replay.
+        """
+        if self._pending.pop(entry_id, None) is None:
+            return
+        self._enqueue({"op": "done", "id": entry_id, "success": success}, None)
+
+    def pending(self) -> List[Dict[str, Any]]:
+        return list(self._pending.values())
+
+    def _enqueue(self, record: Dict[str, Any], future: Optional[asyncio.Future]):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        self._buffer.append((line, future))
+        self._records_since_compact += 1
+
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        # Satu-satunya writer ke file journal. Selama satu fsync berjalan, append
+        # baru menumpuk di buffer dan ikut batch berikutnya (group commit).
+        while self._buffer:
+            if self.group_commit:
+                batch, self._buffer = self._buffer, []
+            else:
+                # Satu fsync per accept; record "done" (tidak ditunggu) ikut write accept
+                # berikutnya seperti pada group commit, bukan fsync sendiri
+                end = next((i + 1 for i, (_, future) in enumerate(self._buffer) if future is not None), len(self._buffer))
+                batch, self._buffer = self._buffer[:end], self._buffer[end:]
+
+            data = b"".join(line for line, _ in batch)
+            try:
+                await asyncio.to_thread(self._write_sync, data)
+            except Exception as e:
+                logger.error(f"Gagal menulis journal: {str(e)}")
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_result(None)
+
+            if self._records_since_compact >= self.compact_threshold and not self._buffer:
+                try:
+                    await asyncio.to_thread(self._compact_sync, dict(self._pending))
+                except Exception as e:
+                    logger.warning(f"Compaction journal gagal: {str(e)}")
+
+        self._flusher = None
+
+    def _write_sync(self, data: bytes):
+        os.write(self._fd, data)
+        os.fsync(self._fd)
+        self.stats["fsyncs"] += 1
+
+    def _compact_sync(self, pending: Dict[str, Dict[str, Any]]):
+        """Tulis ulang journal hanya berisi entry yang belum selesai (atomic rename)"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in pending.values():
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        dir_fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+        self._records_since_compact = len(pending)
+        self.stats["compactions"] += 1
+
+
+def _load_segment(path: str) -> Dict[str, Dict[str, Any]]:
+    """Baca segment journal, return entry yang belum selesai"""
+    pending: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return pending
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Baris terakhir bisa terpotong jika crash di tengah write
+                logger.warning("Journal: record rusak diabaikan")
+                continue
+
+            if record.get("op") == "accept":
+                pending[record["id"]] = record
+            elif record.get("op") == "done":
+                pending.pop(record.get("id"), None)
+    return pending
@@ -22,3 +22,12 @@ class ManualPullResponse(BaseModel):
     message: str
     output: Optional[str] = None
     error: Optional[str] = None
+
+
+class RouteMatchResponse(BaseModel):
+    matched: bool
+    provider: str
+    event: str
+    ref: str
+    rule: Optional[str] = None
+    action: Optional[str] = None
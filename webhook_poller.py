@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+
+from webhook_func import acquire_file_lock, release_file_lock
+from webhook_tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Opsi SSH agar semua ls-remote ke host yang sama memakai satu koneksi (multiplexing)
+SSH_MULTIPLEX = "ssh -o BatchMode=yes -o ControlMaster=auto -o ControlPath={control_dir}/%r@%h:%p -o ControlPersist=120"
+
+
+@dataclass
+class PollTarget:
+    name: str
+    url: str
+    branch: str
+    repo_path: str
+    action: Optional[str] = None  # None: lewat rule routing seperti /webhook
+    min_interval: float = 60.0
+    max_interval: float = 900.0
+    interval: float = 0.0
+    next_due: float = 0.0
+    remote_sha: Optional[str] = None  # SHA remote yang terakhir berhasil di-deploy / sudah ada lokal
+    last_checked: Optional[float] = None
+    last_error: Optional[str] = None
+    deploys: int = 0
+
+    @property
+    def ref(self) -> str:
+        return f"refs/heads/{self.branch}"
+
+    @property
+    def host(self) -> str:
+        return remote_host(self.url)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "branch": self.branch,
+            "remote_sha": self.remote_sha,
+            "interval": round(self.interval, 1),
+            "next_in": round(max(self.next_due - time.monotonic(), 0), 1) if self.next_due != float("inf") else None,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+            "deploys": self.deploys,
+        }
+
+
+def remote_host(url: str) -> str:
+    """Host dari URL git: ssh://host/..., https://host/..., atau git@host:path"""
+    matched = re.match(r"^[a-z+]+://(?:[^@/]+@)?([^/:]+)", url)
+    if matched:
+        return matched.group(1)
+    matched = re.match(r"^(?:[^@/]+@)?([^/:]+):", url)
+    return matched.group(1) if matched else "local"
+
+
+def load_targets(CONFIG, git_url: str) -> List[PollTarget]:
+    """Repository yang dipolling: POLL_REPOS (JSON list) dan/atau repository utama jika POLL_INTERVAL > 0"""
+    targets = []
+    if CONFIG["POLL_INTERVAL"] > 0:
+        targets.append(
+            PollTarget(
+                name="default",
+                url=git_url,
+                branch=CONFIG["BRANCH"],
+                repo_path=CONFIG["REPO_PATH"],
+                min_interval=CONFIG["POLL_INTERVAL"],
+                max_interval=max(CONFIG["POLL_MAX_INTERVAL"], CONFIG["POLL_INTERVAL"]),
+            )
+        )
+
+    if CONFIG.get("POLL_REPOS"):
+        with open(CONFIG["POLL_REPOS"], "r") as f:
+            repos = json.load(f)
+        for repo in repos:
+            min_interval = float(repo.get("interval", CONFIG["POLL_INTERVAL"] or 60))
+            targets.append(
+                PollTarget(
+                    name=repo["name"],
+                    url=repo["url"],
+                    branch=repo.get("branch", "main"),
+                    repo_path=repo["repo_path"],
+                    action=repo.get("action", "deploy"),
+                    min_interval=min_interval,
+                    max_interval=max(float(repo.get("max_interval", CONFIG["POLL_MAX_INTERVAL"])), min_interval),
+                )
+            )
+    return targets
+
+
+class RemotePoller:
+    """Polling head remote dengan `git ls-remote` untuk repository tanpa webhook.
+
+    Target yang jatuh tempo dikelompokkan per URL (satu ls-remote untuk semua
+    branch di URL itu) dan per host (semaphore per host + koneksi SSH yang
+    di-multiplex). Jumlah proses git dibatasi semaphore global. Interval naik
+    bertahap selama remote tidak berubah, kembali ke minimum saat ada commit
+    baru, dan selalu diberi jitter agar ratusan repo tidak dicek bersamaan.
+    """
+
+    def __init__(
+        self,
+        targets: List[PollTarget],
+        deliver: Callable[[PollTarget, str], Awaitable[bool]],
+        concurrency: int = 8,
+        host_concurrency: int = 2,
+        control_dir: str = "/tmp/webhook-ssh",
+        timeout: float = 60.0,
+    ):
+        self.targets = targets
+        self.deliver = deliver
+        self.timeout = timeout
+        self.control_dir = control_dir
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._host_concurrency = host_concurrency
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: set = set()
+        self.active = False  # True jika worker ini yang memegang poll lock
+
+        now = time.monotonic()
+        for target in targets:
+            target.interval = target.min_interval
+            # Sebar polling pertama agar tidak semua repo dicek saat startup
+            target.next_due = now + random.uniform(0, target.min_interval)
+
+    async def run(self, lock_path: str):
+        """Loop polling; hanya satu worker (pemegang lock) yang melakukan polling"""
+        while True:
+            lock_fd = await asyncio.to_thread(acquire_file_lock, lock_path, False)
+            if lock_fd is not None:
+                break
+            await asyncio.sleep(30)
+
+        self.active = True
+        os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+        logger.info(f"Polling {len(self.targets)} repository dimulai")
+
+        # Lock dipegang selama polling berjalan, worker lain menunggu sebagai cadangan
+        try:
+            while True:
+                now = time.monotonic()
+                due = [target for target in self.targets if target.next_due <= now]
+                if due:
+                    # Branch lain di URL yang sama ikut dicek jika jadwalnya sudah dekat,
+                    # agar bisa digabung ke satu ls-remote
+                    urls = {target.url for target in due}
+                    due += [
+                        target
+                        for target in self.targets
+                        if target.url in urls and now < target.next_due <= now + target.interval / 2
+                    ]
+                    # Target yang sedang dicek tidak dijadwalkan lagi sampai selesai,
+                    # dan host yang lambat tidak menahan jadwal host lain
+                    for target in due:
+                        target.next_due = float("inf")
+                    task = asyncio.create_task(self.poll(due))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+                next_due = min((target.next_due for target in self.targets), default=now + 60)
+                await asyncio.sleep(min(max(next_due - time.monotonic(), 0.5), 5))
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            release_file_lock(lock_fd)
+
+    async def poll(self, targets: List[PollTarget]):
+        by_url: Dict[str, List[PollTarget]] = {}
+        for target in targets:
+            by_url.setdefault(target.url, []).append(target)
+        await asyncio.gather(*(self._poll_url(url, group) for url, group in by_url.items()))
+
+    async def _poll_url(self, url: str, targets: List[PollTarget]):
+        host = targets[0].host
+        host_semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self._host_concurrency))
+        pending = list(targets)
+
+        # Target apapun yang belum dijadwalkan (karena error) tetap dijadwalkan ulang,
+        # jika tidak next_due tetap inf dan target tidak pernah dipolling lagi
+        try:
+            async with host_semaphore, self._semaphore:
+                with span("poll", host=host, refs=len(targets)):
+                    heads, error = await self._ls_remote(url, sorted({target.ref for target in targets}))
+
+            for target in targets:
+                target.last_checked = time.time()
+                target.last_error = error
+                if error is not None:
+                    logger.warning(f"Polling {target.name} gagal: {error}")
+                    self._schedule(target, changed=False)
+                    pending.remove(target)
+                    continue
+
+                remote_sha = heads.get(target.ref)
+                if remote_sha is None:
+                    target.last_error = f"{target.ref} tidak ada di remote"
+                    self._schedule(target, changed=False)
+                    pending.remove(target)
+                    continue
+
+                changed = remote_sha != target.remote_sha
+                if changed:
+                    # Checkout bisa sudah di-update lewat /webhook (worker manapun), jadi
+                    # SHA lokal dibaca ulang sebelum deploy (rev-parse lokal, murah)
+                    local_sha = await self._local_sha(target)
+                    if local_sha == remote_sha:
+                        logger.info(f"Polling {target.name}: {target.ref} sudah di {remote_sha[:8]} secara lokal, deploy dilewati")
+                        target.remote_sha = remote_sha
+                    else:
+                        logger.info(f"Polling {target.name}: {target.ref} berubah {(local_sha or '-')[:8]} -> {remote_sha[:8]}")
+                        try:
+                            delivered = await self.deliver(target, remote_sha)
+                        except Exception as e:
+                            logger.error(f"Polling {target.name}: deploy gagal: {type(e).__name__}: {e}")
+                            delivered = False
+                        if delivered:
+                            target.remote_sha = remote_sha
+                            target.deploys += 1
+                self._schedule(target, changed)
+                pending.remove(target)
+        except Exception as e:
+            logger.error(f"Polling {url} gagal: {type(e).__name__}: {e}")
+            for target in pending:
+                target.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            for target in pending:
+                self._schedule(target, changed=False)
+
+    def _schedule(self, target: PollTarget, changed: bool):
+        if changed:
+            target.interval = target.min_interval
+        else:
+            target.interval = min(target.interval * 1.5, target.max_interval)
+        target.next_due = time.monotonic() + target.interval * random.uniform(0.8, 1.2)
+
+    async def _ls_remote(self, url: str, refs: List[str]) -> tuple[Dict[str, str], Optional[str]]:
+        env = dict(os.environ, GIT_SSH_COMMAND=SSH_MULTIPLEX.format(control_dir=self.control_dir), GIT_TERMINAL_PROMPT="0")
+        process = await asyncio.create_subprocess_exec(
+            "git", "ls-remote", url, *refs, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return {}, "ls-remote timeout"
+
+        if process.returncode != 0:
+            return {}, stderr.decode(errors="replace").strip() or f"ls-remote exit {process.returncode}"
+
+        heads = {}
+        for line in stdout.decode().splitlines():
+            sha, _, ref = line.partition("\t")
+            heads[ref] = sha
+        return heads, None
+
+    async def _local_sha(self, target: PollTarget) -> Optional[str]:
+        """SHA branch lokal yang ter-deploy (None jika checkout lokal belum ada)"""
+        if not os.path.isdir(target.repo_path):
+            return None
+        # Bukan refs/remotes/origin: fetch bisa berhasil walaupun merge/checkout gagal
+        for ref in (f"refs/heads/{target.branch}", "HEAD"):
+            process = await asyncio.create_subprocess_exec(
+                "git", "rev-parse", "--verify", "--quiet", ref, cwd=target.repo_path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await process.communicate()
+            if process.returncode == 0:
+                return stdout.decode().strip()
+        return None
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [target.status() for target in self.targets]
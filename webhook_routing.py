@@ -0,0 +1,196 @@
+import re
+import json
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("github", "gitlab", "gitea", "gogs")
+EVENT_KINDS = ("push", "tag_push", "push_delete", "tag_push_delete", "release", "create", "ping")
+ACTIONS = ("deploy", "checkout", "ignore", "ping")
+
+# Action release yang berarti rilis baru; event lain (edited, deleted, ...) tidak
+# di-deploy. GitHub juga mengirim "released" untuk rilis yang sama, diabaikan agar
+# satu rilis hanya satu checkout.
+RELEASE_ACTIONS = {"github": "published", "gitea": "published", "gogs": "published", "gitlab": "create"}
+
+# SHA `after` pada push yang menghapus branch/tag
+NULL_SHA = "0" * 40
+
+# Token ref_regex yang bergantung pada nomor group atau flag global, keduanya rusak
+# saat pattern digabung ke regex bucket: backreference, conditional, flag inline
+UNSAFE_REGEX = re.compile(r"\\[1-9]|\\.|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)")
+
+# Nama event GitLab ("Push Hook", "Tag Push Hook", ...) ke event kind
+GITLAB_EVENTS = {
+    "push hook": "push",
+    "tag push hook": "tag_push",
+    "release hook": "release",
+}
+
+
+@dataclass
+class Route:
+    provider: str
+    event: str
+    ref: str
+    name: Optional[str] = None  # None jika tidak ada rule yang cocok
+    action: Optional[str] = None
+
+
+def detect_event(headers) -> Tuple[str, str]:
+    """Tentukan provider dan nama event mentah dari header request"""
+    # Gitea/Gogs juga mengirim X-GitHub-Event, jadi header mereka dicek lebih dulu
+    for provider, header in (("gitea", "X-Gitea-Event"), ("gogs", "X-Gogs-Event"), ("github", "X-GitHub-Event"), ("gitlab", "X-Gitlab-Event")):
+        event = headers.get(header)
+        if event:
+            return provider, event
+    return "unknown", "unknown"
+
+
+def normalize_event(provider: str, event: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+    """Normalisasi event dari berbagai provider ke (event kind, ref lengkap)"""
+    event = event.lower()
+    ref = payload.get("ref") if isinstance(payload.get("ref"), str) else ""
+
+    if provider == "gitlab":
+        kind = GITLAB_EVENTS.get(event, event.replace(" hook", "").replace(" ", "_"))
+    else:
+        kind = event
+
+    if kind == "release":
+        # Release yang diubah/dihapus dipisah ke event kind sendiri (release_edited, ...)
+        action = payload.get("action") or ""
+        if provider in RELEASE_ACTIONS and action != RELEASE_ACTIONS[provider]:
+            kind = f"release_{action or 'unknown'}"
+        release = payload.get("release") if isinstance(payload.get("release"), dict) else {}
+        tag = release.get("tag_name") or payload.get("tag") or ""
+        ref = f"refs/tags/{tag}" if isinstance(tag, str) and tag else ""
+    elif kind == "create" and payload.get("ref_type") in ("tag", "branch"):
+        # GitHub/Gitea "create" mengirim nama pendek
+        ref = f"refs/{'tags' if payload['ref_type'] == 'tag' else 'heads'}/{ref}"
+    elif kind == "push" and ref.startswith("refs/tags/"):
+        # GitHub dan Gitea mengirim tag push sebagai event "push"
+        kind = "tag_push"
+
+    # Push yang menghapus branch/tag dipisah (push_delete, tag_push_delete), agar
+    # rule deploy/checkout tidak mencoba fetch ref yang sudah tidak ada
+    if kind in ("push", "tag_push") and (payload.get("deleted") is True or payload.get("after") == NULL_SHA):
+        kind = f"{kind}_delete"
+
+    return kind, ref
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Glob ref ke regex: `*` tidak melewati `/`, `**` melewati `/`"""
+    parts = re.split(r"(\*\*|\*|\?)", pattern)
+    mapping = {"**": ".*", "*": "[^/]*", "?": "[^/]"}
+    return "".join(mapping.get(part, re.escape(part)) for part in parts)
+
+
+def default_rules(branch: str) -> List[Dict[str, Any]]:
+    """Rule bawaan, sama dengan perilaku sebelumnya: ping dan push ke BRANCH"""
+    return [
+        {"name": "ping", "events": ["ping"], "action": "ping"},
+        {"name": f"push-{branch}", "events": ["push"], "branches": [branch], "action": "deploy"},
+    ]
+
+
+def load_rules(CONFIG) -> List[Dict[str, Any]]:
+    """Baca rule dari ROUTES_FILE (JSON list), atau rule bawaan jika tidak diset"""
+    if not CONFIG.get("ROUTES_FILE"):
+        return default_rules(CONFIG["BRANCH"])
+
+    with open(CONFIG["ROUTES_FILE"], "r") as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{CONFIG['ROUTES_FILE']}: rule harus berupa JSON list")
+    return rules
+
+
+def _rule_pattern(rule: Dict[str, Any]) -> str:
+    patterns = [glob_to_regex(ref) for ref in rule.get("refs", [])]
+    patterns += [glob_to_regex(f"refs/heads/{branch}") for branch in rule.get("branches", [])]
+    patterns += [glob_to_regex(f"refs/tags/{tag}") for tag in rule.get("tags", [])]
+
+    if rule.get("ref_regex"):
+        compiled = re.compile(rule["ref_regex"])
+        if compiled.groupindex:
+            raise ValueError(f"Rule {rule['name']}: ref_regex tidak boleh memakai named group")
+        for token in UNSAFE_REGEX.findall(rule["ref_regex"]):
+            if not token.startswith("\\") or token[1] in "123456789":
+                raise ValueError(f"Rule {rule['name']}: ref_regex tidak boleh memakai backreference, conditional group, atau flag inline global ('{token}')")
+        patterns.append(rule["ref_regex"])
+
+    return "|".join(f"(?:{pattern})" for pattern in patterns) if patterns else ".*"
+
+
+def _as_list(value, default) -> List[str]:
+    if value is None:
+        return list(default)
+    return [value] if isinstance(value, str) else list(value)
+
+
+class RouteTable:
+    """Rule routing yang sudah dikompilasi.
+
+    Rule dikelompokkan per (provider, event kind) saat startup. Setiap kelompok
+    menjadi satu regex gabungan dengan satu alternatif per rule (urutan rule =
+    prioritas), sehingga satu delivery cukup satu lookup dict dan satu match
+    berapapun jumlah rule.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = []
+        for index, rule in enumerate(rules):
+            rule = dict(rule)
+            rule.setdefault("name", f"rule-{index}")
+            rule["provider"] = [p.lower() for p in _as_list(rule.get("provider"), ["*"])]
+            rule["events"] = [e.lower() for e in _as_list(rule.get("events"), ["push"])]
+            rule["action"] = rule.get("action", "deploy")
+            if rule["action"] not in ACTIONS:
+                raise ValueError(f"Rule {rule['name']}: action tidak dikenal '{rule['action']}'")
+            rule["pattern"] = _rule_pattern(rule)
+            self.rules.append(rule)
+
+        self.providers = set(PROVIDERS) | {p for rule in self.rules for p in rule["provider"] if p != "*"}
+        self.kinds = set(EVENT_KINDS) | {e for rule in self.rules for e in rule["events"] if e != "*"}
+
+        # Key "*" dipakai untuk provider/event yang tidak dikenal: hanya rule wildcard yang berlaku
+        self._buckets: Dict[Tuple[str, str], Optional[Tuple[re.Pattern, List[Dict[str, Any]]]]] = {}
+        for provider in self.providers | {"*"}:
+            for kind in self.kinds | {"*"}:
+                self._buckets[(provider, kind)] = self._compile_bucket(provider, kind)
+
+        logger.info(f"Routing: {len(self.rules)} rule dikompilasi")
+
+    def _compile_bucket(self, provider: str, kind: str):
+        rules = [
+            rule
+            for rule in self.rules
+            if ("*" in rule["provider"] or provider in rule["provider"]) and ("*" in rule["events"] or kind in rule["events"])
+        ]
+        if not rules:
+            return None
+
+        # Group kosong (?P<rN>) diletakkan di akhir alternatif agar match.lastgroup
+        # selalu menunjuk rule yang cocok, walaupun pattern rule punya group sendiri
+        combined = "|".join(f"(?:{rule['pattern']})(?P<r{i}>)" for i, rule in enumerate(rules))
+        return re.compile(combined), rules
+
+    def match(self, provider: str, event: str, payload: Dict[str, Any]) -> Route:
+        """Cari rule pertama yang cocok untuk delivery"""
+        kind, ref = normalize_event(provider, event, payload)
+        route = Route(provider=provider, event=kind, ref=ref)
+
+        bucket = self._buckets[(provider if provider in self.providers else "*", kind if kind in self.kinds else "*")]
+        if bucket is None:
+            return route
+
+        pattern, rules = bucket
+        matched = pattern.fullmatch(ref)
+        if matched is not None:
+            rule = rules[int(matched.lastgroup[1:])]
+            route.name, route.action = rule["name"], rule["action"]
+        return route
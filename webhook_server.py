@@ -1,46 +1,291 @@
 import os
+import re
+import sys
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
 from datetime import datetime, date
 from typing import Optional, Dict, Any
 
-from fastapi import FastAPI, Request, HTTPException, Header, BackgroundTasks
+from fastapi import APIRouter, FastAPI, Request, HTTPException, BackgroundTasks
 from fastapi.responses import JSONResponse
 import uvicorn
-from webhook_func import ensure_webhook_secret, logger, get_secret, verify_signature, pull_repository, process_webhook_background, execute_command
-from webhook_models import WebhookResponse, StatusResponse, ManualPullResponse
+from webhook_func import (
+    ensure_webhook_secret,
+    logger,
+    setup_logging,
+    pull_repository,
+    run_deploy_action,
+    run_post_deploy,
+    process_webhook_background,
+    execute_command,
+    acquire_file_lock,
+    release_file_lock,
+)
+from webhook_models import WebhookResponse, StatusResponse, ManualPullResponse, RouteMatchResponse
+from webhook_journal import WebhookJournal
+from webhook_auth import SecretStore, repository_name, verify_request
+from webhook_routing import Route, RouteTable, detect_event, load_rules
+from webhook_tracing import span, tracer
+from webhook_fanout import FanoutCoordinator, fanout_token, parse_nodes
+from webhook_poller import PollTarget, RemotePoller, load_targets
 
 BRANCH_NAME = os.environ.get("BRANCH", "main")
 REPOSITORY_PATH = os.environ.get("REPO_PATH", "./repository")
 GIT_URL_SSH = os.environ.get("GIT_URL_SSH", "git@gitlab.com:zmutclik/test-repo.git")
 
-ensure_webhook_secret()
-
 # Konfigurasi
 CONFIG = {
     "PORT": 7000,
     "HOST": "0.0.0.0",
-    "SECRET_TOKEN": get_secret("webhook_secret") or "your-secret-token-here",
+    "SECRETS_DIR": os.environ.get("SECRETS_DIR", "/app/secrets" if os.path.isdir("/app/secrets") else "./secrets"),
+    "REQUIRE_SIGNATURE": os.environ.get("WEBHOOK_REQUIRE_SIGNATURE", "false").lower() in ("1", "true", "yes"),  # Tolak webhook tanpa signature
     "REPO_PATH": REPOSITORY_PATH,
     "BRANCH": BRANCH_NAME,
-    "POST_DEPLOY_SCRIPT": None,  # Script yang dijalankan setelah pull (opsional)
+    "POST_DEPLOY_SCRIPT": None,  # Script (atau list step) yang dijalankan setelah pull (opsional)
+    "JOURNAL_DIR": os.environ.get("JOURNAL_DIR", "./logs"),
+    "LOCK_PATH": os.environ.get("DEPLOY_LOCK_PATH", "./logs/deploy.lock"),
+    "STARTUP_LOCK_PATH": "./logs/startup.lock",
+    "REPLAY_ATTEMPTS": int(os.environ.get("REPLAY_ATTEMPTS", 6)),  # Percobaan replay journal saat startup
+    "REPLAY_BACKOFF": float(os.environ.get("REPLAY_BACKOFF", 5)),  # Detik sebelum percobaan ke-2, lalu dikali 2
+    "ROUTES_FILE": os.environ.get("ROUTES_FILE"),  # JSON rule routing (opsional, default: push ke BRANCH)
+    "FANOUT_NODES": parse_nodes(os.environ.get("FANOUT_NODES")),  # Node agent (host:port / unix:/path), kosong = deploy lokal
+    "FANOUT_BATCH_SIZE": int(os.environ.get("FANOUT_BATCH_SIZE", 0)),  # 0 = semua node sekaligus
+    "FANOUT_TIMEOUT": float(os.environ.get("FANOUT_TIMEOUT", 600)),
+    "POLL_INTERVAL": float(os.environ.get("POLL_INTERVAL", 0)),  # Detik, 0 = polling repository utama nonaktif
+    "POLL_MAX_INTERVAL": float(os.environ.get("POLL_MAX_INTERVAL", 900)),
+    "POLL_REPOS": os.environ.get("POLL_REPOS"),  # JSON list repository tambahan yang dipolling (opsional)
+    "POLL_CONCURRENCY": int(os.environ.get("POLL_CONCURRENCY", 8)),
+    "POLL_HOST_CONCURRENCY": int(os.environ.get("POLL_HOST_CONCURRENCY", 2)),
+    "POLL_LOCK_PATH": "./logs/poll.lock",
 }
 
+router = APIRouter()
+
+
+def repo_config(repo_path: str, branch: str) -> Dict[str, Any]:
+    """CONFIG untuk repository lain (polling), dengan deploy lock sendiri"""
+    if repo_path == CONFIG["REPO_PATH"] and branch == CONFIG["BRANCH"]:
+        return CONFIG
+    slug = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.abspath(repo_path).strip("/"))
+    return {**CONFIG, "REPO_PATH": repo_path, "BRANCH": branch, "LOCK_PATH": f"{CONFIG['LOCK_PATH']}.{slug}"}
+
+
+async def dispatch_deploy(app: FastAPI, action: str, ref: str, config: Dict[str, Any] = CONFIG) -> tuple[bool, str]:
+    """Deploy lokal, atau teruskan ke node agent jika mode fan-out aktif"""
+    fanout = app.state.fanout
+    if fanout is None or config is not CONFIG:
+        return await run_deploy_action(config, action, ref)
+
+    success, summary = await fanout.deploy(action, ref)
+    logger.info(f"Fan-out {summary['status']}: {summary['succeeded']}/{summary['total']} node")
+    lines = [f"{node['node']}: {node['status']}" + (f" - {node['output'].strip()}" if node.get("output") else "") for node in summary["nodes"]]
+    return success, "\n".join(lines)
+
+
+async def deploy_route(app: FastAPI, route: Route, after: Optional[str] = None, delivery_id: Optional[str] = None, config: Dict[str, Any] = CONFIG):
+    """Catat delivery ke journal lalu jalankan deploy; dipakai /webhook dan polling"""
+    # Catat ke journal sebelum diproses, agar bisa di-replay jika container restart
+    journal = app.state.journal
+    repo_key = (config["REPO_PATH"], config["BRANCH"])
+    older = [entry["id"] for entry in journal.pending() if (entry.get("repo_path"), entry.get("branch")) == repo_key]
+    with span("queue"):
+        entry_id = await journal.append(
+            {
+                "event": route.event,
+                "ref": route.ref,
+                "action": route.action,
+                "rule": route.name,
+                "after": after,
+                "delivery": delivery_id,
+                "repo_path": config["REPO_PATH"],
+                "branch": config["BRANCH"],
+            }
+        )
 
-# FastAPI app
-app = FastAPI(
-    title="Git Webhook Server",
-    description="Aplikasi webhook untuk otomatis pull git repository",
-    version="1.0.0",
-)
+    success, message = await dispatch_deploy(app, route.action, route.ref, config)
+    journal.mark_done(entry_id, success)
+    if success:
+        # Entry lama repository ini (mis. replay yang masih gagal) sudah digantikan deploy ini
+        for older_id in older:
+            journal.mark_done(older_id, True)
+    return success, message
+
+
+async def replay_journal(app: FastAPI, journal: WebhookJournal, entries: list, stop: asyncio.Event):
+    """Replay webhook yang belum selesai sebelum restart"""
+    # Deploy terakhir menentukan isi checkout, jadi entry yang tertunda cukup
+    # di-replay dengan menjalankan entry terbaru untuk setiap repository.
+    logger.info(f"Replay {len(entries)} webhook dari journal")
+    by_repo: Dict[tuple, list] = {}
+    for entry in entries:
+        by_repo.setdefault((entry.get("repo_path", CONFIG["REPO_PATH"]), entry.get("branch", CONFIG["BRANCH"])), []).append(entry)
+
+    for (repo_path, branch), repo_entries in by_repo.items():
+        latest = max(repo_entries, key=lambda entry: entry.get("ts", ""))
+        delay = CONFIG["REPLAY_BACKOFF"]
+        for attempt in range(1, CONFIG["REPLAY_ATTEMPTS"] + 1):
+            # Webhook baru untuk repository yang sama menggantikan entry lama
+            if latest["id"] not in {entry["id"] for entry in journal.pending()}:
+                logger.info(f"Replay journal {repo_path} dilewati, sudah ada webhook yang lebih baru")
+                break
+
+            with span("replay", entries=len(repo_entries), repo=repo_path, attempt=attempt):
+                success, message = await dispatch_deploy(app, latest.get("action", "deploy"), latest.get("ref", ""), repo_config(repo_path, branch))
+            if success:
+                logger.info(f"Replay journal {repo_path} berhasil")
+                for entry in repo_entries:
+                    journal.mark_done(entry["id"], success)
+                break
+
+            # Setelah restart, network / SSH agent bisa belum siap: coba lagi dengan backoff
+            logger.error(f"Replay journal {repo_path} gagal (percobaan {attempt}/{CONFIG['REPLAY_ATTEMPTS']}): {message}")
+            if attempt == CONFIG["REPLAY_ATTEMPTS"]:
+                # Entry tetap pending di journal dan di-replay lagi saat startup berikutnya
+                logger.error(f"Replay journal {repo_path} ditunda sampai restart berikutnya")
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                delay = min(delay * 2, 300)
+            else:
+                return
+
+
+async def deliver_poll(app: FastAPI, target: PollTarget, sha: str) -> bool:
+    """Deploy karena polling menemukan commit baru, lewat jalur yang sama dengan /webhook"""
+    with span("receive", provider="poll", repo=target.name):
+        if target.action is None:
+            route = app.state.routes.match("poll", "push", {"ref": target.ref})
+        else:
+            route = Route(provider="poll", event="push", ref=target.ref, name=f"poll-{target.name}", action=target.action)
+
+        if route.action not in ("deploy", "checkout"):
+            logger.info(f"Polling {target.name}: {target.ref} tidak cocok dengan rule deploy, diabaikan")
+            return True
+
+        success, message = await deploy_route(app, route, sha, f"poll-{sha[:12]}", repo_config(target.repo_path, target.branch))
+    if not success:
+        logger.error(f"Polling {target.name}: deploy gagal: {message}")
+    return success
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+
+    # Side effect startup diserialisasi antar worker agar tidak balapan membuat secret
+    startup_lock = await asyncio.to_thread(acquire_file_lock, CONFIG["STARTUP_LOCK_PATH"])
+    try:
+        ensure_webhook_secret()
+    finally:
+        release_file_lock(startup_lock)
+
+    app.state.secrets = SecretStore(CONFIG["SECRETS_DIR"])
+
+    app.state.routes = RouteTable(load_rules(CONFIG))
+
+    if CONFIG["FANOUT_NODES"] and not fanout_token():
+        raise RuntimeError("FANOUT_NODES diset tetapi secret fanout_token tidak ditemukan")
+
+    # Setiap worker punya segment journal sendiri, segment worker yang mati diambil alih
+    journal = WebhookJournal(os.path.join(CONFIG["JOURNAL_DIR"], f"webhook-{os.getpid()}.journal"))
+    pending = journal.open()
+    pending += await journal.adopt_orphans()
+    app.state.journal = journal
+
+    app.state.fanout = None
+    if CONFIG["FANOUT_NODES"]:
+        app.state.fanout = FanoutCoordinator(CONFIG["FANOUT_NODES"], fanout_token(), batch_size=CONFIG["FANOUT_BATCH_SIZE"], timeout=CONFIG["FANOUT_TIMEOUT"])
+        await app.state.fanout.connect()
+
+    replay_stop = asyncio.Event()
+    replay_task = asyncio.create_task(replay_journal(app, journal, pending, replay_stop)) if pending else None
+
+    # Polling untuk repository tanpa webhook; hanya satu worker yang aktif (poll lock)
+    app.state.poller = None
+    poll_task = None
+    targets = load_targets(CONFIG, GIT_URL_SSH)
+    if targets:
+        app.state.poller = RemotePoller(
+            targets,
+            lambda target, sha: deliver_poll(app, target, sha),
+            concurrency=CONFIG["POLL_CONCURRENCY"],
+            host_concurrency=CONFIG["POLL_HOST_CONCURRENCY"],
+        )
+        poll_task = asyncio.create_task(app.state.poller.run(CONFIG["POLL_LOCK_PATH"]))
+
+    yield
+
+    if poll_task is not None:
+        poll_task.cancel()
+        try:
+            await poll_task
+        except asyncio.CancelledError:
+            pass
+    if replay_task is not None:
+        # Deploy yang sedang berjalan ditunggu, retry berikutnya dibatalkan (entry tetap pending)
+        replay_stop.set()
+        await replay_task
+    if app.state.fanout is not None:
+        await app.state.fanout.close()
+    await journal.close()
+    tracer.shutdown()
+
+
+def create_app() -> FastAPI:
+    """App factory, dipakai uvicorn (factory=True) di setiap worker"""
+    app = FastAPI(
+        title="Git Webhook Server",
+        description="Aplikasi webhook untuk otomatis pull git repository",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+    app.include_router(router)
+    return app
+
+
+async def read_delivery(request: Request) -> Dict[str, Any]:
+    """Parse payload dan verifikasi signature webhook"""
+    # Baca request body
+    body = await request.body()
+
+    # Parse payload (nama repository dibutuhkan untuk memilih secret)
+    with span("parse", size=len(body)):
+        try:
+            payload = await request.json()
+        except Exception as e:
+            logger.error(f"Error parsing JSON: {str(e)}")
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+
+        # Payload webhook selalu JSON object; belum terverifikasi, jadi dicek sebelum dipakai
+        if not payload or not isinstance(payload, dict):
+            logger.error("Payload kosong atau invalid")
+            raise HTTPException(status_code=400, detail="Invalid payload")
+
+    # Verifikasi signature sesuai provider (GitHub, GitLab, Gitea)
+    secrets = request.app.state.secrets
+    with span("verify") as verify_span:
+        if secrets.has_secrets():
+            valid, provider = verify_request(secrets, request.headers, body, repository_name(payload))
+            verify_span.set_tag("provider", provider)
+            if not valid and (provider != "unsigned" or CONFIG["REQUIRE_SIGNATURE"]):
+                logger.warning(f"Signature verification gagal ({provider})")
+                raise HTTPException(status_code=401, detail="Unauthorized")
+            if provider == "unsigned":
+                logger.warning("Webhook tanpa signature diterima walaupun secret tersedia (set WEBHOOK_REQUIRE_SIGNATURE=true untuk menolak)")
+        elif CONFIG["REQUIRE_SIGNATURE"]:
+            # Fail closed: SECRETS_DIR salah, file tidak terbaca, atau terpotong saat rotasi
+            logger.error(f"Signature wajib tetapi tidak ada secret yang termuat dari {CONFIG['SECRETS_DIR']}")
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+    return payload
 
 
-@app.post("/webhook", response_model=WebhookResponse)
+@router.post("/webhook", response_model=WebhookResponse)
 async def webhook(
     request: Request,
     background_tasks: BackgroundTasks,
-    x_hub_signature_256: Optional[str] = Header(None),
-    x_github_event: Optional[str] = Header(None),
-    x_gitlab_event: Optional[str] = Header(None),
-    x_gitea_event: Optional[str] = Header(None),
 ):
     """Endpoint webhook untuk menerima notifikasi dari git service"""
 
@@ -55,49 +300,33 @@ async def webhook(
         pass
     logger.info(f"Webhook diterima dari IP: {client_ip}")
 
-    # Baca request body
-    body = await request.body()
-
-    # Verifikasi signature (untuk GitHub)
-    if CONFIG["SECRET_TOKEN"] and x_hub_signature_256:
-        if not verify_signature(body, x_hub_signature_256, CONFIG["SECRET_TOKEN"]):
-            logger.warning("Signature verification gagal")
-            raise HTTPException(status_code=401, detail="Unauthorized")
-
-    # Parse payload
-    try:
-        payload = await request.json()
-        if not payload:
-            logger.error("Payload kosong atau invalid")
-            raise HTTPException(status_code=400, detail="Invalid payload")
+    with span("receive", client_ip=client_ip):
+        payload = await read_delivery(request)
 
-    except Exception as e:
-        logger.error(f"Error parsing JSON: {str(e)}")
-        raise HTTPException(status_code=400, detail="Invalid JSON")
+        # Log event info
+        provider, event_type = detect_event(request.headers)
+        logger.info(f"Event type: {event_type} ({provider})")
 
-    # Log event info
-    event_type = x_github_event or x_gitlab_event or x_gitea_event or "unknown"
-    logger.info(f"Event type: {event_type}")
+        with span("route", provider=provider, event=event_type) as route_span:
+            route = request.app.state.routes.match(provider, event_type, payload)
+            route_span.set_tag("rule", route.name)
 
-    # Hanya proses push events
-    if "push" in event_type.lower():
-        ref = payload.get("ref", "")
-        target_ref = f"refs/heads/{CONFIG['BRANCH']}"
-
-        if ref == target_ref:
-            logger.info(f"Push ke branch {CONFIG['BRANCH']} terdeteksi")
+        if route.action in ("deploy", "checkout"):
+            logger.info(f"Event {route.event} ke {route.ref} cocok dengan rule {route.name} ({route.action})")
 
             # Informasi commit
-            commits = payload.get("commits", [])
-            if commits:
+            commits = payload.get("commits")
+            if isinstance(commits, list) and commits and isinstance(commits[-1], dict):
                 latest_commit = commits[-1]
-                logger.info(f"Latest commit: {latest_commit.get('id', '')[:8]} - {latest_commit.get('message', '')}")
+                logger.info(f"Latest commit: {str(latest_commit.get('id', ''))[:8]} - {latest_commit.get('message', '')}")
 
-            # Pull repository (sync untuk response cepat)
-            success, message = await pull_repository(CONFIG)
+            # Deploy (sync untuk response cepat)
+            delivery_id = request.headers.get("X-Gitea-Delivery") or request.headers.get("X-Gogs-Delivery") or request.headers.get("X-GitHub-Delivery")
+            success, message = await deploy_route(request.app, route, payload.get("after"), delivery_id)
 
-            # Juga jalankan background task untuk processing tambahan
-            background_tasks.add_task(process_webhook_background, CONFIG, payload, event_type)
+            # Juga jalankan background task untuk processing tambahan (hanya untuk checkout lokal)
+            if request.app.state.fanout is None:
+                background_tasks.add_task(process_webhook_background, CONFIG, payload, event_type)
 
             if success:
                 return WebhookResponse(status="success", message="Repository berhasil diupdate", timestamp=datetime.now().isoformat(), output=message)
@@ -109,35 +338,57 @@ async def webhook(
                         status="error", message="Gagal update repository", error=message, timestamp=datetime.now().isoformat()
                     ).dict(),
                 )
+
+        elif route.action == "ping":
+            logger.info("Ping event diterima")
+            return WebhookResponse(status="success", message="Pong! Webhook aktif", timestamp=datetime.now().isoformat())
+
+        elif route.action == "ignore":
+            logger.info(f"Event {route.event} ke {route.ref} diabaikan oleh rule {route.name}")
+            return WebhookResponse(status="ignored", message=f"Diabaikan oleh rule {route.name}", timestamp=datetime.now().isoformat())
+
         else:
-            logger.info(f"Push ke branch lain ({ref}), diabaikan")
-            return WebhookResponse(status="ignored", message="Branch diabaikan", timestamp=datetime.now().isoformat())
+            logger.info(f"Event {route.event} ({route.ref or '-'}) tidak cocok dengan rule manapun, diabaikan")
+            return WebhookResponse(status="ignored", message=f"Event {event_type} diabaikan", timestamp=datetime.now().isoformat())
 
-    elif event_type == "ping":
-        logger.info("Ping event diterima")
-        return WebhookResponse(status="success", message="Pong! Webhook aktif", timestamp=datetime.now().isoformat())
 
-    else:
-        logger.info(f"Event {event_type} diabaikan")
-        return WebhookResponse(status="ignored", message=f"Event {event_type} diabaikan", timestamp=datetime.now().isoformat())
+@router.post("/webhook/dry-run", response_model=RouteMatchResponse)
+async def webhook_dry_run(request: Request):
+    """Tampilkan rule yang cocok untuk payload, tanpa menjalankan deploy"""
+    payload = await read_delivery(request)
+    provider, event_type = detect_event(request.headers)
+    route = request.app.state.routes.match(provider, event_type, payload)
+
+    return RouteMatchResponse(
+        matched=route.name is not None, rule=route.name, action=route.action, provider=route.provider, event=route.event, ref=route.ref
+    )
 
 
-@app.get("/status", response_model=StatusResponse)
-async def status():
+@router.get("/status", response_model=StatusResponse)
+async def status(request: Request):
     """Endpoint untuk cek status aplikasi"""
     return StatusResponse(
         status="running",
         timestamp=datetime.now().isoformat(),
-        config={"repo_path": CONFIG["REPO_PATH"], "branch": CONFIG["BRANCH"], "has_secret": bool(CONFIG["SECRET_TOKEN"]), "port": CONFIG["PORT"]},
+        config={
+            "repo_path": CONFIG["REPO_PATH"],
+            "branch": CONFIG["BRANCH"],
+            "has_secret": request.app.state.secrets.has_secrets(),
+            "port": CONFIG["PORT"],
+            "journal_pending": len(request.app.state.journal.pending()),
+            "routes": [rule["name"] for rule in request.app.state.routes.rules],
+            "fanout_nodes": CONFIG["FANOUT_NODES"],
+        },
     )
 
 
-@app.post("/manual-pull", response_model=ManualPullResponse)
+@router.post("/manual-pull", response_model=ManualPullResponse)
 async def manual_pull():
     """Endpoint untuk manual pull (untuk testing)"""
     logger.info("Manual pull dipicu")
 
-    success, message = await pull_repository(CONFIG)
+    with span("manual_pull"):
+        success, message = await pull_repository(CONFIG)
 
     if success:
         return ManualPullResponse(status="success", message="Manual pull berhasil", output=message)
@@ -145,7 +396,25 @@ async def manual_pull():
         raise HTTPException(status_code=500, detail=ManualPullResponse(status="error", message="Manual pull gagal", error=message).dict())
 
 
-@app.get("/")
+@router.get("/fanout/status")
+async def fanout_status(request: Request):
+    """Status koneksi node dan hasil fan-out deploy terakhir"""
+    if request.app.state.fanout is None:
+        return {"enabled": False}
+    return {"enabled": True, **request.app.state.fanout.status()}
+
+
+@router.get("/poll/status")
+async def poll_status(request: Request):
+    """Status polling setiap repository (interval, SHA terakhir, error)"""
+    if request.app.state.poller is None:
+        return {"enabled": False}
+    # Dengan beberapa worker hanya satu yang melakukan polling, worker lain menunggu sebagai cadangan
+    poller = request.app.state.poller
+    return {"enabled": True, "active_worker": poller.active, "pid": os.getpid(), "repositories": poller.status()}
+
+
+@router.get("/")
 async def root():
     """Root endpoint dengan info dasar"""
     return {
@@ -154,14 +423,17 @@ async def root():
         "status": "running",
         "endpoints": {
             "webhook": "/webhook (POST)",
+            "webhook_dry_run": "/webhook/dry-run (POST)",
             "status": "/status (GET)",
             "manual_pull": "/manual-pull (POST)",
+            "fanout_status": "/fanout/status (GET)",
+            "poll_status": "/poll/status (GET)",
             "docs": "/docs (GET)",
         },
     }
 
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     """Health check endpoint"""
     repo_exists = os.path.exists(CONFIG["REPO_PATH"])
@@ -173,7 +445,7 @@ async def health_check():
     }
 
 
-@app.post("/clone")
+@router.post("/clone")
 async def clone_repository():
     """Endpoint untuk clone repository (inisialisasi awal)"""
     logger.info("Clone repository dipicu")
@@ -231,12 +503,7 @@ async def clone_repository():
     logger.info("Repository berhasil di-clone")
 
     # Jalankan post-deploy script jika ada
-    if CONFIG["POST_DEPLOY_SCRIPT"]:
-        logger.info("Menjalankan post-deploy script setelah clone...")
-        script_success, script_output = await execute_command(CONFIG["POST_DEPLOY_SCRIPT"], cwd=CONFIG["REPO_PATH"])
-
-        if not script_success:
-            logger.warning(f"Post-deploy script gagal: {script_output}")
+    await run_post_deploy(CONFIG)
 
     return JSONResponse(
         status_code=200,
@@ -249,18 +516,48 @@ async def clone_repository():
     )
 
 
-if __name__ == "__main__":
-    # Validasi konfigurasi
-    if not os.path.exists(CONFIG["REPO_PATH"]):
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Git Webhook Server")
+    parser.add_argument("--host", default=CONFIG["HOST"])
+    parser.add_argument("--port", type=int, default=CONFIG["PORT"])
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)), help="Jumlah worker process")
+    parser.add_argument("--loop", default="auto", choices=["auto", "asyncio", "uvloop"], help="Event loop (uvloop: pip install uvloop)")
+    parser.add_argument("--http", default="auto", choices=["auto", "h11", "httptools"], help="HTTP parser (httptools: pip install httptools)")
+    args = parser.parse_args()
+
+    setup_logging()
+
+    # Validasi konfigurasi (receiver fan-out tidak butuh checkout lokal)
+    if not CONFIG["FANOUT_NODES"] and not os.path.exists(CONFIG["REPO_PATH"]):
         logger.error(f"Repository path tidak ditemukan: {CONFIG['REPO_PATH']}")
         logger.error("Silakan sesuaikan CONFIG['REPO_PATH'] dengan path repository Anda")
-        exit(1)
+        sys.exit(1)
 
     logger.info("=== Git Webhook Server Starting ===")
     logger.info(f"Repository: {CONFIG['REPO_PATH']}")
     logger.info(f"Branch: {CONFIG['BRANCH']}")
-    logger.info(f"Port: {CONFIG['PORT']}")
-    logger.info("FastAPI Documentation: http://localhost:7000/docs")
+    logger.info(f"Port: {args.port}")
+    logger.info(f"Workers: {args.workers} (loop={args.loop}, http={args.http})")
+    if CONFIG["FANOUT_NODES"]:
+        logger.info(f"Fan-out ke {len(CONFIG['FANOUT_NODES'])} node: {', '.join(CONFIG['FANOUT_NODES'])}")
+    logger.info(f"FastAPI Documentation: http://localhost:{args.port}/docs")
     logger.info("========================================================")
 
-    uvicorn.run("webhook_server:app", host=CONFIG["HOST"], port=CONFIG["PORT"], reload=False, log_level="warning")
+    uvicorn.run(
+        "webhook_server:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        reload=False,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Tracing ringan untuk request webhook dan deploy.
+
+Span diekspor dalam format Zipkin v2 JSON (satu span per baris) ke file lokal,
+dikirim per batch. Ringkasan critical path dan stage paling lambat:
+
+    python webhook_tracing.py summary --since 1h
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import atexit
+import argparse
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
+
+SERVICE_NAME = "git-webhook"
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "sampled", "tags", "start_us", "_start")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, sampled: bool, tags: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.tags = tags
+        self.start_us = int(time.time() * 1_000_000)
+        self._start = time.perf_counter()
+
+    def set_tag(self, key: str, value: Any):
+        if self.sampled:
+            self.tags[key] = value
+
+    def to_zipkin(self, duration_us: int) -> Dict[str, Any]:
+        record = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": self.start_us,
+            "duration": max(duration_us, 1),
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+            "tags": {key: str(value) for key, value in self.tags.items()},
+        }
+        if self.parent_id:
+            record["parentId"] = self.parent_id
+        return record
+
+
+class BatchSpanExporter:
+    """Kumpulkan span di memory dan tulis ke file per batch (ukuran atau interval)"""
+
+    def __init__(self, path: str, batch_size: int = 64, interval: float = 5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, record: Dict[str, Any]):
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+
+        if self._thread is None:
+            self._start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch)
+        try:
+            trace_dir = os.path.dirname(self.path)
+            if trace_dir:
+                os.makedirs(trace_dir, exist_ok=True)
+            # Satu write O_APPEND per batch, aman dipakai beberapa worker sekaligus
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, data.encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+class Tracer:
+    def __init__(self, exporter: BatchSpanExporter, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self._current: ContextVar[Optional[Span]] = ContextVar("webhook_span", default=None)
+
+    @contextmanager
+    def span(self, name: str, **tags):
+        """Buat span; keputusan sampling diambil di root span dan diwarisi child"""
+        parent = self._current.get()
+        if parent is None:
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+            span = Span(os.urandom(16).hex(), None, name, sampled, tags)
+        else:
+            span = Span(parent.trace_id, parent.span_id, name, parent.sampled, tags)
+
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_tag("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self._current.reset(token)
+            if span.sampled:
+                self.exporter.export(span.to_zipkin(int((time.perf_counter() - span._start) * 1_000_000)))
+
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+    def shutdown(self):
+        self.exporter.flush()
+
+
+tracer = Tracer(
+    BatchSpanExporter(
+        os.environ.get("TRACE_FILE", "./logs/traces.jsonl"),
+        batch_size=int(os.environ.get("TRACE_BATCH_SIZE", 64)),
+        interval=float(os.environ.get("TRACE_FLUSH_INTERVAL", 5.0)),
+    ),
+    sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", 1.0)),
+)
+span = tracer.span
+
+
+def parse_window(value: str) -> float:
+    """Window waktu seperti 30m, 2h, 7d ke detik"""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def load_spans(path: str, since_us: int) -> Dict[str, List[Dict[str, Any]]]:
+    traces: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("timestamp", 0) >= since_us:
+                traces.setdefault(record["traceId"], []).append(record)
+    return traces
+
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[tuple[int, Dict[str, Any]]]:
+    """Critical path trace sebagai list (depth, span) urut waktu.
+
+    Mulai dari akhir parent, ambil child yang selesai paling akhir, lalu mundur ke
+    child yang selesai sebelum child itu mulai, dan seterusnya (rekursif).
+    """
+    by_id = {s["id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in spans:
+        parent = s.get("parentId") if s.get("parentId") in by_id else None
+        children.setdefault(parent, []).append(s)
+
+    def expand(parent: Dict[str, Any], depth: int) -> List[tuple[int, Dict[str, Any]]]:
+        chain = []
+        cursor = parent["timestamp"] + parent["duration"]
+        candidates = sorted(children.get(parent["id"], []), key=lambda s: s["timestamp"] + s["duration"], reverse=True)
+        for child in candidates:
+            # Toleransi 1 ms: timestamp dari wall clock, durasi dari perf_counter
+            if child["timestamp"] + child["duration"] <= cursor + 1000:
+                chain.append(child)
+                cursor = child["timestamp"]
+
+        path = [(depth, parent)]
+        for child in reversed(chain):
+            path += expand(child, depth + 1)
+        return path
+
+    roots = children.get(None, [])
+    if not roots:
+        return []
+    return expand(max(roots, key=lambda s: s["duration"]), 0)
+
+
+def percentile(values: List[int], fraction: float) -> int:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summary(path: str, window: str, top: int):
+    since_us = int((time.time() - parse_window(window)) * 1_000_000)
+    traces = load_spans(path, since_us)
+    if not traces:
+        print(f"Tidak ada span dalam {window} terakhir di {path}")
+        return
+
+    stages: Dict[str, List[int]] = {}
+    for spans in traces.values():
+        for s in spans:
+            stages.setdefault(s["name"], []).append(s["duration"])
+
+    print(f"{len(traces)} trace dalam {window} terakhir")
+    print("=" * 72)
+    print(f"{'stage':<20} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'total s':>10}")
+    for name, durations in sorted(stages.items(), key=lambda item: sum(item[1]), reverse=True):
+        print(
+            f"{name:<20} {len(durations):>7} {percentile(durations, 0.5) / 1000:>10.1f} "
+            f"{percentile(durations, 0.95) / 1000:>10.1f} {max(durations) / 1000:>10.1f} {sum(durations) / 1_000_000:>10.2f}"
+        )
+
+    print()
+    print(f"Critical path {top} trace paling lambat:")
+    slowest = sorted(traces.values(), key=lambda spans: max(s["duration"] for s in spans), reverse=True)[:top]
+    for spans in slowest:
+        chain = critical_path(spans)
+        if not chain:
+            continue
+        root = chain[0][1]
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(root["timestamp"] / 1_000_000))
+        print(f"  {started}  {root['duration'] / 1000:.1f} ms  trace {root['traceId'][:16]}")
+        for depth, s in chain:
+            print(f"    {'  ' * depth}{s['name']:<{24 - 2 * depth}} {s['duration'] / 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ringkasan trace webhook")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="Stage paling lambat dan critical path")
+    summary_parser.add_argument("--since", default="1h", help="Window waktu, contoh: 30m, 2h, 7d")
+    summary_parser.add_argument("--file", default=tracer.exporter.path)
+    summary_parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"File trace tidak ditemukan: {args.file}")
+        sys.exit(1)
+    summary(args.file, args.since, args.top)
+
+
+if __name__ == "__main__":
+    main()